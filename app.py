@@ -1,35 +1,54 @@
 import os
 import re
-import qrcode
-from io import BytesIO
+import sys
+import subprocess
+import time
+import csv
+import json
+import zlib
+import hashlib
+from io import BytesIO, StringIO
 import base64
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session, flash
+from xml.sax.saxutils import escape as xml_escape
+from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session, flash, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from functools import wraps
-import vobject
+from functools import wraps, lru_cache
+from jinja2 import FileSystemBytecodeCache
+import click
+from invalidation import create_bus
 
 # ============================================
 # CONFIGURATION FLASK
 # ============================================
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///profils.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///profils.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-# ✅ SÉCURITÉ: Mot de passe admin
-ADMIN_PASSWORD_HASH = os.environ.get('ADMIN_PASSWORD_HASH') or generate_password_hash('admin123')
+# ✅ SÉCURITÉ: Mot de passe admin (hash par défaut calculé à la première connexion, scrypt est lent)
+ADMIN_PASSWORD_HASH = os.environ.get('ADMIN_PASSWORD_HASH')
+
+# ✅ PERFORMANCE: Cache bytecode Jinja persistant (rempli par `flask precompile-templates`)
+app.config['JINJA_CACHE_DIR'] = os.environ.get('JINJA_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+if os.environ.get('JINJA_BYTECODE_CACHE', '1') != '0':
+    os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR'])}
 
 # Créer dossier uploads
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 db = SQLAlchemy(app)
 
+# ✅ INVALIDATION: Bus d'événements « profil modifié » partagé entre workers / nœuds
+app.config['INVALIDATION_BUS_URL'] = os.environ.get('INVALIDATION_BUS_URL') or 'sqlite:///' + os.path.join(app.instance_path, 'invalidation.db')
+invalidation_bus = create_bus(app.config['INVALIDATION_BUS_URL'])
+
 # ============================================
 # MODÈLES
 # ============================================
@@ -95,10 +114,29 @@ class Lien(db.Model):
     click_count = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    health = db.relationship('LienHealth', backref='lien', uselist=False, lazy=True, cascade='all, delete-orphan')
+    
     def __repr__(self):
         return f'<Lien {self.type_lien}>'
 
 
+class LienHealth(db.Model):
+    """Dernier résultat de `flask check-links` pour un lien"""
+    __tablename__ = 'liens_health'
+    
+    lien_id = db.Column(db.Integer, db.ForeignKey('liens.id'), primary_key=True)
+    url = db.Column(db.String(500))  # URL vérifiée : si le lien change, le résultat est périmé
+    status_code = db.Column(db.Integer)
+    final_url = db.Column(db.String(500))
+    redirects = db.Column(db.Integer, default=0)
+    error = db.Column(db.String(50))  # timeout, robots, skipped, redirect_loop...
+    is_ok = db.Column(db.Boolean, nullable=True)  # None : non vérifiable (mailto:, robots.txt)
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<LienHealth {self.lien_id} {self.status_code or self.error}>'
+
+
 class Analytics(db.Model):
     __tablename__ = 'analytics'
     
@@ -110,6 +148,9 @@ class Analytics(db.Model):
     user_agent = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Index pour l'export par pagination keyset sur (created_at, id)
+    __table_args__ = (db.Index('ix_analytics_created_at_id', 'created_at', 'id'),)
+    
     def __repr__(self):
         return f'<Analytics {self.event_type}>'
 
@@ -139,6 +180,10 @@ def generate_slug(name):
     slug = re.sub(r'[^a-z0-9]+', '-', slug).strip('-')
     return slug
 
+@lru_cache(maxsize=None)
+def get_admin_password_hash():
+    return ADMIN_PASSWORD_HASH or generate_password_hash('admin123')
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -164,6 +209,63 @@ def send_webhook(profil, event_type, data=None):
     except Exception as e:
         app.logger.error(f'Webhook error: {str(e)}')
 
+def make_qr_png(data, error_correction='L'):
+    """Image PNG d'un QR code, prête pour send_file"""
+    import qrcode  # import paresseux : PIL n'est chargé qu'à la première génération
+    
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=getattr(qrcode.constants, f'ERROR_CORRECT_{error_correction}'),
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill_color='black', back_color='white')
+    img_io = BytesIO()
+    img.save(img_io, 'PNG')
+    img_io.seek(0)
+    return img_io
+
+def make_vcard(profil, profile_url):
+    """Texte vCard du profil"""
+    import vobject  # import paresseux
+    
+    vcard = vobject.vCard()
+    vcard.add('fn')
+    vcard.fn.value = profil.nom or 'Contact'
+    
+    if profil.titre:
+        vcard.add('title')
+        vcard.title.value = profil.titre
+    
+    if profil.email:
+        vcard.add('email')
+        vcard.email.value = profil.email
+        vcard.email.type_param = 'INTERNET'
+    
+    if profil.telephone:
+        vcard.add('tel')
+        vcard.tel.value = profil.telephone
+        vcard.tel.type_param = 'CELL'
+    
+    if profil.biographie:
+        vcard.add('note')
+        vcard.note.value = profil.biographie[:500]
+    
+    vcard.add('url')
+    vcard.url.value = profile_url
+    
+    return vcard.serialize()
+
+def publish_profil_changed(profil_id, slug, kind):
+    """Publie l'invalidation après commit ; les caches s'abonnent via invalidation_bus.subscribe"""
+    try:
+        invalidation_bus.publish(profil_id, slug, kind)
+    except Exception as e:
+        app.logger.error(f'Invalidation bus error: {str(e)}')
+
 # ============================================
 # ROUTES PUBLIQUES
 # ============================================
@@ -235,6 +337,22 @@ def track_click(lien_id):
     
     return redirect(lien.url)
 
+# Pixel GIF 1x1 transparent
+BEACON_GIF = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+@app.route('/beacon/<slug_profil>.gif')
+def view_beacon(slug_profil):
+    """Enregistre une vue depuis une page exportée en statique"""
+    profil = Profil.query.filter_by(slug=slug_profil).first_or_404()
+    
+    view_event = Analytics(profil_id=profil.id, event_type='view')
+    db.session.add(view_event)
+    db.session.commit()
+    
+    response = send_file(BytesIO(BEACON_GIF), mimetype='image/gif')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.route('/qr/<slug_profil>')
 def qr_code_generator(slug_profil):
     """Génère un QR code"""
@@ -242,53 +360,15 @@ def qr_code_generator(slug_profil):
     
     profile_url = request.url_root.rstrip('/') + url_for('profil_public', slug_profil=profil.slug)
     
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(profile_url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color='black', back_color='white')
-    img_io = BytesIO()
-    img.save(img_io, 'PNG')
-    img_io.seek(0)
-    
-    return send_file(img_io, mimetype='image/png')
+    return send_file(make_qr_png(profile_url), mimetype='image/png')
 
 @app.route('/vcard/<slug_profil>')
 def vcard(slug_profil):
     """Télécharge la vCard"""
     profil = Profil.query.filter_by(slug=slug_profil).first_or_404()
     
-    vcard = vobject.vCard()
-    vcard.add('fn')
-    vcard.fn.value = profil.nom or 'Contact'
-    
-    if profil.titre:
-        vcard.add('title')
-        vcard.title.value = profil.titre
-    
-    if profil.email:
-        vcard.add('email')
-        vcard.email.value = profil.email
-        vcard.email.type_param = 'INTERNET'
-    
-    if profil.telephone:
-        vcard.add('tel')
-        vcard.tel.value = profil.telephone
-        vcard.tel.type_param = 'CELL'
-    
-    if profil.biographie:
-        vcard.add('note')
-        vcard.note.value = profil.biographie[:500]
-    
-    vcard.add('url')
-    vcard.url.value = request.url_root.rstrip('/') + url_for('profil_public', slug_profil=profil.slug)
-    
-    response_data = vcard.serialize()
+    profile_url = request.url_root.rstrip('/') + url_for('profil_public', slug_profil=profil.slug)
+    response_data = make_vcard(profil, profile_url)
     
     return send_file(
         BytesIO(response_data.encode('utf-8')),
@@ -306,7 +386,7 @@ def admin_login():
     if request.method == 'POST':
         password = request.form.get('password', '')
         
-        if check_password_hash(ADMIN_PASSWORD_HASH, password):
+        if check_password_hash(get_admin_password_hash(), password):
             session['admin_logged_in'] = True
             flash('✅ Connexion réussie !', 'success')
             return redirect(url_for('admin_dashboard'))
@@ -376,6 +456,7 @@ def create_profil():
         
         db.session.add(profil)
         db.session.commit()
+        publish_profil_changed(profil.id, profil.slug, 'profile_created')
         
         flash('✅ Profil créé avec succès !', 'success')
         send_webhook(profil, 'profile_created')
@@ -432,6 +513,7 @@ def edit_profil(slug_profil):
         
         profil.updated_at = datetime.utcnow()
         db.session.commit()
+        publish_profil_changed(profil.id, profil.slug, 'profile_updated')
         
         flash('✅ Profil mis à jour !', 'success')
         send_webhook(profil, 'profile_updated')
@@ -445,8 +527,10 @@ def delete_profil(slug_profil):
     """Supprimer un profil"""
     profil = Profil.query.filter_by(slug=slug_profil).first_or_404()
     nom = profil.nom
+    profil_id = profil.id
     db.session.delete(profil)
     db.session.commit()
+    publish_profil_changed(profil_id, slug_profil, 'profile_deleted')
     
     flash(f'✅ Profil "{nom}" supprimé', 'success')
     return redirect(url_for('admin_dashboard'))
@@ -459,7 +543,7 @@ def delete_profil(slug_profil):
 def manage_liens(slug_profil):
     """Page de gestion des liens avec drag & drop"""
     profil = Profil.query.filter_by(slug=slug_profil).first_or_404()
-    liens = Lien.query.filter_by(profil_id=profil.id).order_by(Lien.link_order).all()
+    liens = Lien.query.options(db.joinedload(Lien.health)).filter_by(profil_id=profil.id).order_by(Lien.link_order).all()
     return render_template('admin/manage_liens.html', profil=profil, liens=liens)
 
 @app.route('/admin/profil/<int:profil_id>/lien', methods=['POST'])
@@ -485,6 +569,7 @@ def add_lien(profil_id):
     
     db.session.add(lien)
     db.session.commit()
+    publish_profil_changed(profil.id, profil.slug, 'link_added')
     
     flash(f'✅ Lien {type_lien} ajouté', 'success')
     send_webhook(profil, 'link_added', {'type': type_lien})
@@ -505,6 +590,7 @@ def update_lien(lien_id):
     
     lien.url = url
     db.session.commit()
+    publish_profil_changed(lien.profil_id, lien.profil.slug, 'link_updated')
     
     flash('✅ Lien mis à jour', 'success')
     return redirect(url_for('manage_liens', slug_profil=lien.profil.slug))
@@ -515,8 +601,10 @@ def delete_lien(lien_id):
     """Supprimer un lien"""
     lien = Lien.query.get_or_404(lien_id)
     profil_slug = lien.profil.slug
+    profil_id = lien.profil_id
     db.session.delete(lien)
     db.session.commit()
+    publish_profil_changed(profil_id, profil_slug, 'link_deleted')
     
     flash('✅ Lien supprimé', 'success')
     return redirect(url_for('manage_liens', slug_profil=profil_slug))
@@ -528,12 +616,16 @@ def reorder_liens():
     data = request.get_json()
     link_ids = data.get('link_ids', [])
     
+    profils = {}
     for index, link_id in enumerate(link_ids):
         lien = Lien.query.get(link_id)
         if lien:
             lien.link_order = index
+            profils[lien.profil_id] = lien.profil.slug
     
     db.session.commit()
+    for profil_id, slug in profils.items():
+        publish_profil_changed(profil_id, slug, 'links_reordered')
     return jsonify({'success': True})
 
 # ============================================
@@ -563,6 +655,7 @@ def parametres_profil(slug_profil):
             profil.profil_password = None
         
         db.session.commit()
+        publish_profil_changed(profil.id, profil.slug, 'settings_updated')
         flash('✅ Paramètres sauvegardés', 'success')
         send_webhook(profil, 'settings_updated')
         return redirect(url_for('parametres_profil', slug_profil=slug_profil))
@@ -638,22 +731,8 @@ def qr_download(slug_profil):
     
     profile_url = request.url_root.rstrip('/') + url_for('profil_public', slug_profil=profil.slug)
     
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(profile_url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color='black', back_color='white')
-    img_io = BytesIO()
-    img.save(img_io, 'PNG')
-    img_io.seek(0)
-    
     return send_file(
-        img_io,
+        make_qr_png(profile_url, error_correction='H'),
         mimetype='image/png',
         as_attachment=True,
         download_name=f'qr_{profil.slug}.png'
@@ -731,6 +810,140 @@ def export_pdf(slug_profil):
         flash('❌ ReportLab non installé. Installez: pip install reportlab', 'danger')
         return redirect(url_for('edit_profil', slug_profil=slug_profil))
 
+# ============================================
+# ROUTES ADMIN - EXPORT ANALYTICS BRUTES
+# ============================================
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'columns': ('application/x-ndjson', 'columns.ndjson'),  # un bloc colonne par ligne JSON
+}
+EXPORT_COLUMNS = ['id', 'profil_id', 'lien_id', 'event_type', 'ip_address', 'user_agent', 'created_at']
+EXPORT_CHUNK_SIZE = 5000
+
+def encode_export_cursor(created_at, event_id):
+    raw = f'{created_at.isoformat()}|{event_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_export_cursor(token):
+    """Retourne (created_at, id) ; lève ValueError si le jeton est invalide"""
+    padded = token + '=' * (-len(token) % 4)
+    created_at, event_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+    return datetime.fromisoformat(created_at), int(event_id)
+
+def parse_export_date(value, end=False):
+    """YYYY-MM-DD -> datetime ; une date de fin est incluse (borne au lendemain minuit)"""
+    if not value:
+        return None
+    date = datetime.strptime(value, '%Y-%m-%d')
+    return date + timedelta(days=1) if end else date
+
+def iter_analytics_chunks(conn, profil_id=None, debut=None, fin=None, after=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Parcourt les événements par pagination keyset sur (created_at, id), un bloc à la fois.
+
+    La mémoire reste constante quelle que soit la taille de la table : seules
+    `chunk_size` lignes sont chargées à la fois, sans OFFSET ni identity map.
+    """
+    table = Analytics.__table__
+    base = db.select(*[table.c[name] for name in EXPORT_COLUMNS]).where(table.c.created_at.isnot(None))
+    if profil_id is not None:
+        base = base.where(table.c.profil_id == profil_id)
+    if debut:
+        base = base.where(table.c.created_at >= debut)
+    if fin:
+        base = base.where(table.c.created_at < fin)
+    base = base.order_by(table.c.created_at, table.c.id).limit(chunk_size)
+
+    while True:
+        query = base
+        if after:
+            created_at, event_id = after
+            query = query.where(db.or_(
+                table.c.created_at > created_at,
+                db.and_(table.c.created_at == created_at, table.c.id > event_id),
+            ))
+        rows = conn.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1].created_at, rows[-1].id)
+
+def export_row_values(row):
+    values = row._asdict()
+    values['created_at'] = row.created_at.isoformat()
+    values['cursor'] = encode_export_cursor(row.created_at, row.id)
+    return values
+
+def serialize_analytics_chunks(chunks, fmt):
+    """Sérialise les blocs au fil de l'eau ; chaque ligne (ou bloc) porte son curseur de reprise"""
+    if fmt == 'csv':
+        yield ','.join(EXPORT_COLUMNS + ['cursor']) + '\r\n'
+
+    for rows in chunks:
+        if fmt == 'columns':
+            columns = {name: [getattr(row, name) for row in rows] for name in EXPORT_COLUMNS}
+            columns['created_at'] = [created_at.isoformat() for created_at in columns['created_at']]
+            block = {
+                'count': len(rows),
+                'cursor': encode_export_cursor(rows[-1].created_at, rows[-1].id),
+                'columns': columns,
+            }
+            yield json.dumps(block, ensure_ascii=False) + '\n'
+        elif fmt == 'ndjson':
+            yield ''.join(json.dumps(export_row_values(row), ensure_ascii=False) + '\n' for row in rows)
+        else:
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                values = export_row_values(row)
+                writer.writerow([values[name] for name in EXPORT_COLUMNS + ['cursor']])
+            yield buffer.getvalue()
+
+def gzip_stream(chunks):
+    """Compresse un flux de texte en gzip sans le mettre en mémoire"""
+    compressor = zlib.compressobj(wbits=31)  # 31 = conteneur gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.route('/admin/analytics/export')
+@app.route('/admin/profil/<slug_profil>/analytics/export')
+@admin_required
+def export_analytics(slug_profil=None):
+    """Export brut des événements en streaming (CSV, NDJSON ou blocs colonnes)"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Format inconnu: {fmt}'}), 400
+
+    profil_id = None
+    if slug_profil:
+        profil_id = Profil.query.filter_by(slug=slug_profil).first_or_404().id
+
+    try:
+        debut = parse_export_date(request.args.get('debut'))
+        fin = parse_export_date(request.args.get('fin'), end=True)
+        cursor = request.args.get('cursor')
+        after = decode_export_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'Paramètres debut, fin ou cursor invalides'}), 400
+
+    chunks = iter_analytics_chunks(db.session, profil_id, debut, fin, after)
+    body = serialize_analytics_chunks(chunks, fmt)
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    headers = {'Content-Disposition': f'attachment; filename=analytics_{slug_profil or "tous"}.{extension}'}
+    if request.args.get('gzip') != '0':
+        headers['Vary'] = 'Accept-Encoding'
+        if request.accept_encodings['gzip']:
+            body = gzip_stream(body)
+            headers['Content-Encoding'] = 'gzip'
+
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
 # ============================================
 # GESTION ERREURS
 # ============================================
@@ -742,6 +955,534 @@ def not_found(error):
 def server_error(error):
     return render_template('500.html'), 500
 
+# ============================================
+# COMMANDES CLI - BASE DE DONNÉES
+# ============================================
+def create_missing_indexes(conn, tables=None):
+    """Crée les index déclarés sur les modèles mais absents des tables existantes (create_all les ignore)"""
+    for table in tables or db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+@app.cli.command('init-db')
+def init_db():
+    """Crée les tables et index manquants sans toucher aux données (idempotent, à lancer au déploiement)"""
+    with db.engine.begin() as conn:
+        db.metadata.create_all(conn)
+        create_missing_indexes(conn)
+    click.echo('✅ Tables et index à jour')
+
+# ============================================
+# COMMANDES CLI - DÉMARRAGE
+# ============================================
+@app.cli.command('precompile-templates')
+def precompile_templates():
+    """Compile tous les templates dans le cache bytecode Jinja (à lancer au déploiement)"""
+    if not app.jinja_env.bytecode_cache:
+        click.echo('❌ Cache bytecode désactivé (JINJA_BYTECODE_CACHE=0)')
+        return
+
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    click.echo(f'✅ {len(names)} templates compilés dans {app.config["JINJA_CACHE_DIR"]}')
+
+@app.cli.command('import-profile')
+@click.option('--top', default=25, help='Nombre de modules à afficher')
+def import_profile(top):
+    """Rapport des modules les plus lents à importer (python -X importtime)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=app.root_path, capture_output=True, text=True
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+
+    rows.sort(reverse=True)
+    click.echo(f'{"cumulé (ms)":>12} {"propre (ms)":>12}  module')
+    for cumulative_us, self_us, module in rows[:top]:
+        click.echo(f'{cumulative_us / 1000:>12.1f} {self_us / 1000:>12.1f}  {module}')
+
+@app.cli.command('bench-startup')
+@click.option('--runs', default=5, help='Nombre de processus à lancer')
+@click.option('--url', default='/', help='URL de la première requête')
+def bench_startup(runs, url):
+    """Mesure le temps de démarrage du processus et la latence de la première requête"""
+    script = (
+        'import time; t0 = time.perf_counter(); import app; t1 = time.perf_counter(); '
+        f'app.app.test_client().get({url!r}); t2 = time.perf_counter(); '
+        'print(t1 - t0, t2 - t1)'
+    )
+
+    imports, first_requests = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', script], cwd=app.root_path,
+                                capture_output=True, text=True, check=True)
+        total = time.perf_counter() - start
+        import_s, request_s = map(float, result.stdout.split()[-2:])
+        imports.append(import_s)
+        first_requests.append(request_s)
+        click.echo(f'  processus {total * 1000:7.1f} ms | import {import_s * 1000:7.1f} ms | 1re requête {request_s * 1000:7.1f} ms')
+
+    click.echo(f'📊 médiane import: {sorted(imports)[runs // 2] * 1000:.1f} ms, '
+               f'médiane 1re requête: {sorted(first_requests)[runs // 2] * 1000:.1f} ms')
+
+# ============================================
+# COMMANDES CLI - EXPORT ANALYTICS
+# ============================================
+@app.cli.command('export-analytics')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--profil', 'slug_profil', default=None, help='Slug du profil (tous par défaut)')
+@click.option('--debut', default=None, help='Date de début YYYY-MM-DD')
+@click.option('--fin', default=None, help='Date de fin incluse YYYY-MM-DD')
+@click.option('--cursor', default=None, help="Curseur de reprise (dernier curseur reçu)")
+@click.option('--output', '-o', default='-', help='Fichier de sortie (stdout par défaut)')
+@click.option('--gzip', 'use_gzip', is_flag=True, help='Compresser la sortie en gzip')
+@click.option('--chunk-size', default=EXPORT_CHUNK_SIZE)
+def export_analytics_command(fmt, slug_profil, debut, fin, cursor, output, use_gzip, chunk_size):
+    """Exporte les événements analytics bruts en streaming"""
+    profil_id = None
+    if slug_profil:
+        profil = Profil.query.filter_by(slug=slug_profil).first()
+        if not profil:
+            raise click.BadParameter(f'Profil introuvable: {slug_profil}', param_hint='--profil')
+        profil_id = profil.id
+
+    try:
+        after = decode_export_cursor(cursor) if cursor else None
+        chunks = iter_analytics_chunks(db.session, profil_id, parse_export_date(debut),
+                                       parse_export_date(fin, end=True), after, chunk_size)
+    except ValueError:
+        raise click.UsageError('Paramètres --debut, --fin ou --cursor invalides')
+
+    body = serialize_analytics_chunks(chunks, fmt)
+    body = gzip_stream(body) if use_gzip else (text.encode('utf-8') for text in body)
+    with click.open_file(output, 'wb') as f:
+        for data in body:
+            f.write(data)
+
+@app.cli.command('bench-export')
+@click.option('--rows', default=1_000_000, help="Nombre d'événements à générer")
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--db-path', default=None, help='Base SQLite de bench à (ré)utiliser')
+@click.option('--existing', is_flag=True, help='Mesurer la table analytics telle quelle (ni création, ni index, ni génération)')
+def bench_export(rows, fmt, db_path, existing):
+    """Mesure lignes/s et pic mémoire de l'export sur une table synthétique ou existante"""
+    import tempfile
+    import tracemalloc
+    from sqlalchemy import create_engine
+
+    if existing and not db_path:
+        raise click.UsageError('--existing nécessite --db-path')
+    db_path = db_path or os.path.join(tempfile.gettempdir(), f'bench_analytics_{rows}.db')
+    engine = create_engine(f'sqlite:///{db_path}')
+    table = Analytics.__table__
+
+    if existing:
+        with engine.connect() as conn:
+            rows = conn.execute(db.select(db.func.count()).select_from(table)).scalar()
+            indexes = {index['name'] for index in db.inspect(conn).get_indexes(table.name)}
+        if 'ix_analytics_created_at_id' not in indexes:
+            click.echo('⚠️ Index ix_analytics_created_at_id absent : chaque page fait un scan complet (lancer `flask init-db`)')
+    else:
+        with engine.begin() as conn:
+            table.create(conn, checkfirst=True)
+            create_missing_indexes(conn, [table])
+            count = conn.execute(db.select(db.func.count()).select_from(table)).scalar()
+            if count < rows:
+                click.echo(f'🔄 Génération de {rows - count} événements dans {db_path}...')
+                start = datetime(2024, 1, 1)
+                for offset in range(count, rows, 50_000):
+                    conn.execute(table.insert(), [{
+                        'profil_id': i % 100 + 1,
+                        'event_type': 'click' if i % 5 == 0 else 'view',
+                        'ip_address': f'10.0.{i % 256}.{i % 251}',
+                        'user_agent': 'Mozilla/5.0 (bench)',
+                        'created_at': start + timedelta(seconds=i // 3),
+                    } for i in range(offset, min(offset + 50_000, rows))])
+
+    def run_export():
+        with engine.connect() as conn, open(os.devnull, 'w') as devnull:
+            for text in serialize_analytics_chunks(iter_analytics_chunks(conn), fmt):
+                devnull.write(text)
+
+    t0 = time.perf_counter()
+    run_export()
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    run_export()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    click.echo(f'📊 {rows} lignes en {elapsed:.1f} s ({rows / elapsed:,.0f} lignes/s), '
+               f'pic mémoire Python {peak / 1024 / 1024:.1f} Mo')
+
+# ============================================
+# COMMANDES CLI - INVALIDATION
+# ============================================
+@app.cli.command('bench-invalidation')
+@click.option('--workers', default=4, help='Nombre de processus abonnés')
+@click.option('--events', default=50, help="Nombre d'événements publiés")
+@click.option('--interval', default=0.05, help='Pause entre deux publications (s)')
+@click.option('--url', default=None, help='Backend du bus (celui de la config par défaut)')
+def bench_invalidation(workers, events, interval, url):
+    """Mesure la fenêtre d'obsolescence entre publication et réception dans d'autres processus"""
+    import multiprocessing
+    from invalidation import bench_listener
+
+    url = url or app.config['INVALIDATION_BUS_URL']
+    if not url or url == 'local':
+        raise click.UsageError('Le bus local ne traverse pas les processus : utiliser un backend sqlite:/// ou redis://')
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=bench_listener, args=(url, events, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        results.get(timeout=60)  # 'ready'
+
+    bus = create_bus(url)
+    for i in range(events):
+        bus.publish(0, 'bench', 'bench')
+        time.sleep(interval)
+
+    delays, in_order = [], True
+    for _ in processes:
+        received = results.get(timeout=90)
+        versions = [version for version, _ in received]
+        in_order = in_order and versions == sorted(versions)
+        delays.extend(delay for _, delay in received)
+    for process in processes:
+        process.join()
+
+    delays.sort()
+    expected = workers * events
+    if not delays:
+        click.echo(f'❌ 0/{expected} livraisons : aucun abonné n\'a reçu d\'événement')
+        return
+    click.echo(f'📊 {len(delays)}/{expected} livraisons, ordre {"✅" if in_order else "❌"} | '
+               f'obsolescence p50 {delays[len(delays) // 2] * 1000:.1f} ms, '
+               f'p95 {delays[int(len(delays) * 0.95)] * 1000:.1f} ms, max {delays[-1] * 1000:.1f} ms')
+
+# ============================================
+# COMMANDES CLI - EXPORT STATIQUE
+# ============================================
+# L'arborescence reprend les URLs publiques : nginx sert `try_files $uri $uri/index.html @flask`
+# (image/png sous /qr/, text/vcard sous /vcard/) et tout le reste retombe sur Flask
+# (/click, /beacon, profils protégés, uploads).
+SITEMAP_MAX_URLS = 50000
+
+def static_export_paths(out_dir, slug):
+    return {
+        'html': os.path.join(out_dir, 'profil', slug, 'index.html'),
+        'qr': os.path.join(out_dir, 'qr', slug),
+        'vcard': os.path.join(out_dir, 'vcard', slug),
+    }
+
+def write_static_file(path, data):
+    """Écriture atomique : nginx ne sert jamais une page à moitié écrite"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def static_build_key(base_url):
+    """Empreinte des templates de profil et de l'URL de base ; si elle change, tout est régénéré"""
+    digest = hashlib.sha1(base_url.encode('utf-8'))
+    for name in sorted(app.jinja_env.list_templates()):
+        if name == 'profil_public.html' or name.startswith('profil_templates/'):
+            source, _, _ = app.jinja_loader.get_source(app.jinja_env, name)
+            digest.update(source.encode('utf-8'))
+    return digest.hexdigest()
+
+def static_profil_fingerprints():
+    """slug -> (empreinte updated_at + liens, date de modification) des profils publics"""
+    digests, profils = {}, {}
+    rows = db.session.execute(
+        db.select(Profil.id, Profil.slug, Profil.updated_at).where(Profil.is_protected.isnot(True))
+    )
+    for profil_id, slug, updated_at in rows:
+        digests[profil_id] = hashlib.sha1(str(updated_at).encode('utf-8'))
+        profils[profil_id] = (slug, updated_at)
+
+    liens = db.session.execute(
+        db.select(Lien.profil_id, Lien.id, Lien.type_lien, Lien.nom, Lien.url, Lien.link_order)
+        .order_by(Lien.profil_id, Lien.id)
+    )
+    for lien in liens:
+        if lien.profil_id in digests:
+            digests[lien.profil_id].update(repr(tuple(lien)).encode('utf-8'))
+
+    return {
+        slug: (digests[profil_id].hexdigest(), (updated_at or datetime.utcnow()).strftime('%Y-%m-%d'))
+        for profil_id, (slug, updated_at) in profils.items()
+    }
+
+def render_static_batch(out_dir, base_url, slugs, with_qr):
+    """Rend un lot de profils : HTML, vCard et QR (exécuté dans un processus du pool)"""
+    with app.test_request_context(base_url=base_url):
+        profils = Profil.query.options(db.selectinload(Profil.liens)).filter(Profil.slug.in_(slugs)).all()
+        for profil in profils:
+            paths = static_export_paths(out_dir, profil.slug)
+            profile_url = url_for('profil_public', slug_profil=profil.slug, _external=True)
+            liens = sorted(profil.liens, key=lambda lien: lien.link_order or 0)
+
+            html = render_template('profil_public.html',
+                                   profil=profil,
+                                   liens=liens,
+                                   template_name=f'profil_templates/{profil.template}.html',
+                                   static_export=True)
+            write_static_file(paths['html'], html.encode('utf-8'))
+            write_static_file(paths['vcard'], make_vcard(profil, profile_url).encode('utf-8'))
+            # le QR ne dépend que de l'URL : inutile de le refaire à chaque modification
+            if with_qr or not os.path.exists(paths['qr']):
+                write_static_file(paths['qr'], make_qr_png(profile_url).getvalue())
+    return slugs
+
+def _init_static_worker():
+    # ne pas réutiliser les connexions héritées du processus parent
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def write_sitemap(out_dir, base_url, entries):
+    """sitemap.xml, découpé en sitemap index au-delà de 50 000 URLs"""
+    def urlset(chunk):
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for slug, lastmod in chunk:
+            loc = url_for('profil_public', slug_profil=slug, _external=True)
+            lines.append(f'  <url><loc>{xml_escape(loc)}</loc><lastmod>{lastmod}</lastmod></url>')
+        lines.append('</urlset>')
+        return '\n'.join(lines).encode('utf-8')
+
+    with app.test_request_context(base_url=base_url):
+        chunks = [entries[i:i + SITEMAP_MAX_URLS] for i in range(0, len(entries), SITEMAP_MAX_URLS)] or [[]]
+        if len(chunks) == 1:
+            write_static_file(os.path.join(out_dir, 'sitemap.xml'), urlset(chunks[0]))
+            return
+
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for number, chunk in enumerate(chunks, 1):
+            write_static_file(os.path.join(out_dir, f'sitemap-{number}.xml'), urlset(chunk))
+            lines.append(f'  <sitemap><loc>{xml_escape(base_url.rstrip("/"))}/sitemap-{number}.xml</loc></sitemap>')
+        lines.append('</sitemapindex>')
+        write_static_file(os.path.join(out_dir, 'sitemap.xml'), '\n'.join(lines).encode('utf-8'))
+
+@app.cli.command('export-static')
+@click.option('--output', '-o', default=None, help='Dossier de sortie (instance/static_site par défaut)')
+@click.option('--base-url', default=lambda: os.environ.get('PUBLIC_BASE_URL', 'http://localhost:5000'),
+              help='URL publique du site (QR, vCard, sitemap)')
+@click.option('--workers', default=os.cpu_count() or 1, help='Nombre de processus de rendu')
+@click.option('--batch-size', default=200, help='Profils par lot envoyé à un processus')
+@click.option('--full', is_flag=True, help='Tout régénérer en ignorant le manifeste')
+def export_static(output, base_url, workers, batch_size, full):
+    """Pré-rend les profils publics (HTML, QR, vCard, sitemap), de façon incrémentale"""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    out_dir = output or os.path.join(app.instance_path, 'static_site')
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    start = time.perf_counter()
+    build_key = static_build_key(base_url)
+    rebuild_all = full or manifest.get('build') != build_key
+    previous = manifest.get('profils', {})
+    current = static_profil_fingerprints()
+
+    # profils supprimés ou devenus protégés : leurs fichiers ne doivent plus être servis
+    removed = [slug for slug in previous if slug not in current]
+    for slug in removed:
+        for path in static_export_paths(out_dir, slug).values():
+            if os.path.exists(path):
+                os.remove(path)
+
+    changed = sorted(slug for slug, (fingerprint, _) in current.items()
+                     if rebuild_all or previous.get(slug) != fingerprint)
+    changed_set = set(changed)
+    done = {slug: fingerprint for slug, fingerprint in previous.items()
+            if slug in current and slug not in changed_set}
+    batches = [changed[i:i + batch_size] for i in range(0, len(changed), batch_size)]
+
+    completed = False
+    try:
+        if workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(workers, initializer=_init_static_worker) as pool:
+                futures = [pool.submit(render_static_batch, out_dir, base_url, batch, rebuild_all) for batch in batches]
+                for future in as_completed(futures):
+                    done.update((slug, current[slug][0]) for slug in future.result())
+        else:
+            for batch in batches:
+                done.update((slug, current[slug][0]) for slug in render_static_batch(out_dir, base_url, batch, rebuild_all))
+        completed = True
+    finally:
+        # manifeste partiel en cas d'erreur : le build suivant reprend les lots manquants.
+        # La nouvelle clé n'est écrite qu'une fois tout rendu : sinon le build suivant ne
+        # régénérerait pas les QR restants, qui garderaient l'ancienne --base-url.
+        build = build_key if completed else manifest.get('build')
+        write_static_file(manifest_path, json.dumps({'build': build, 'profils': done}).encode('utf-8'))
+
+    write_sitemap(out_dir, base_url, sorted((slug, lastmod) for slug, (_, lastmod) in current.items()))
+    click.echo(f'✅ {len(changed)} profils régénérés, {len(removed)} retirés, '
+               f'{len(current) - len(changed)} inchangés en {time.perf_counter() - start:.1f} s → {out_dir}')
+
+@app.cli.command('bench-static-export')
+@click.option('--profils', 'count', default=100_000, help='Nombre de profils synthétiques')
+@click.option('--workers', default=os.cpu_count() or 1)
+@click.option('--changed', default=0.01, help='Part des profils modifiés avant le build incrémental')
+def bench_static_export(count, workers, changed):
+    """Mesure les builds complet puis incrémental sur une base synthétique"""
+    import tempfile
+    from sqlalchemy import create_engine
+
+    work_dir = tempfile.mkdtemp(prefix='bench_static_')
+    db_path = os.path.join(work_dir, 'bench.db')
+    engine = create_engine(f'sqlite:///{db_path}')
+    db.metadata.create_all(engine)
+
+    click.echo(f'🔄 Génération de {count} profils dans {db_path}...')
+    with engine.begin() as conn:
+        for offset in range(0, count, 10_000):
+            ids = range(offset, min(offset + 10_000, count))
+            conn.execute(Profil.__table__.insert(), [{
+                'id': i + 1,
+                'slug': f'bench-{i}',
+                'nom': f'Profil Bench {i}',
+                'titre': 'Consultant',
+                'biographie': 'Profil généré pour le bench export statique.',
+                'email': f'bench{i}@example.com',
+                'template': 'modern',
+            } for i in ids])
+            conn.execute(Lien.__table__.insert(), [{
+                'profil_id': i + 1,
+                'type_lien': 'Website',
+                'nom': 'Site',
+                'url': f'https://example.com/{i}',
+            } for i in ids])
+
+    env = {**os.environ, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'INVALIDATION_BUS_URL': 'local'}
+    command = [sys.executable, '-m', 'flask', '--app', 'app', 'export-static',
+               '--output', os.path.join(work_dir, 'site'), '--workers', str(workers)]
+
+    def timed_build():
+        t0 = time.perf_counter()
+        subprocess.run(command, cwd=app.root_path, env=env, check=True, capture_output=True)
+        return time.perf_counter() - t0
+
+    full_s = timed_build()
+    step = max(1, round(1 / changed)) if changed else count + 1
+    with engine.begin() as conn:
+        conn.execute(Profil.__table__.update().where(Profil.__table__.c.id % step == 0)
+                     .values(updated_at=datetime.utcnow()))
+    incremental_s = timed_build()
+
+    click.echo(f'📊 build complet {full_s:.1f} s ({count / full_s:,.0f} profils/s), '
+               f'incrémental ({count // step} modifiés) {incremental_s:.1f} s → {work_dir}')
+
+# ============================================
+# COMMANDES CLI - SANTÉ DES LIENS
+# ============================================
+@app.cli.command('check-links')
+@click.option('--max-age', default=24, help='Revérifier les liens contrôlés il y a plus de N heures')
+@click.option('--limit', default=None, type=int, help='Nombre maximal de liens à vérifier')
+@click.option('--batch-size', default=5000, help='Liens vérifiés puis enregistrés par lot')
+@click.option('--concurrency', default=100, help='Requêtes simultanées')
+@click.option('--per-host', default=4, help='Requêtes simultanées par hôte')
+@click.option('--timeout', default=10.0, help='Délai maximal par requête (s)')
+@click.option('--all', 'recheck_all', is_flag=True, help="Tout revérifier sans tenir compte de l'historique")
+def check_links(max_age, limit, batch_size, concurrency, per_host, timeout, recheck_all):
+    """Vérifie les URLs jamais vérifiées, modifiées ou plus anciennes que --max-age"""
+    from link_health import check_urls
+
+    started = datetime.utcnow()
+    stale_before = started if recheck_all else started - timedelta(hours=max_age)
+
+    checked = broken = 0
+    start = time.perf_counter()
+    while limit is None or checked < limit:
+        size = batch_size if limit is None else min(batch_size, limit - checked)
+        liens = (Lien.query
+                 .outerjoin(Lien.health)
+                 .options(db.contains_eager(Lien.health))
+                 .filter(db.or_(
+                     LienHealth.lien_id.is_(None),
+                     LienHealth.url != Lien.url,
+                     LienHealth.checked_at < stale_before,
+                 ))
+                 .order_by(LienHealth.checked_at.isnot(None), LienHealth.checked_at, Lien.id)
+                 .limit(size)
+                 .all())
+        if not liens:
+            break
+
+        results = check_urls([lien.url for lien in liens], concurrency=concurrency, per_host=per_host, timeout=timeout)
+        now = datetime.utcnow()
+        for lien in liens:
+            result = results[lien.url]
+            if not lien.health:
+                lien.health = LienHealth(lien_id=lien.id)
+            lien.health.url = lien.url
+            lien.health.status_code = result['status_code']
+            lien.health.final_url = result['final_url']
+            lien.health.redirects = len(result['redirects'])
+            lien.health.error = result['error']
+            lien.health.is_ok = result['is_ok']
+            lien.health.checked_at = now
+            broken += result['is_ok'] is False
+        db.session.commit()
+
+        checked += len(liens)
+        click.echo(f'  {checked} liens vérifiés ({broken} en erreur)')
+
+    elapsed = time.perf_counter() - start
+    click.echo(f'✅ {checked} liens vérifiés en {elapsed:.1f} s, {broken} en erreur')
+
+@app.cli.command('bench-link-check')
+@click.option('--urls', 'count', default=2000, help="Nombre d'URLs à vérifier")
+@click.option('--hosts', default=20, help='Nombre de serveurs locaux (un hôte par port)')
+@click.option('--latency', default=0.05, help='Latence simulée par réponse (s)')
+@click.option('--concurrency', default=100)
+@click.option('--per-host', default=8)
+@click.option('--timeout', default=5.0, help='Délai maximal par requête (s)')
+def bench_link_check(count, hosts, latency, concurrency, per_host, timeout):
+    """Mesure le débit (URLs/s) du vérificateur contre des serveurs HTTP locaux
+
+    Avec peu d'hôtes (ex. --hosts 1 --latency 0.3 --timeout 3), vérifie aussi que
+    l'attente d'une place auprès d'un hôte n'est pas comptée comme timeout.
+    """
+    import asyncio
+    from link_health import LinkChecker, start_stub_servers
+
+    async def run():
+        runner, base_urls = await start_stub_servers(hosts, latency)
+        paths = ['/ok', '/nohead', '/redirect/2', '/missing']
+        urls = [f'{base_urls[i % hosts]}{paths[i % len(paths)]}?n={i}' for i in range(count)]
+        try:
+            t0 = time.perf_counter()
+            results = await LinkChecker(concurrency=concurrency, per_host=per_host, timeout=timeout).check_all(urls)
+            return results, time.perf_counter() - t0
+        finally:
+            await runner.cleanup()
+
+    results, elapsed = asyncio.run(run())
+    ok = sum(1 for result in results.values() if result['is_ok'])
+    timeouts = sum(1 for result in results.values() if result['error'] == 'timeout')
+    click.echo(f'📊 {count} URLs en {elapsed:.1f} s ({count / elapsed:,.0f} URLs/s), '
+               f'{ok} OK, {count - ok} en erreur (séquentiel : ≥ {count * latency:.0f} s)')
+    # les serveurs locaux répondent tous bien avant --timeout : tout timeout vient de l'attente du pool
+    click.echo(f'{"✅" if not timeouts else "❌"} {timeouts} timeouts')
+
 # ============================================
 # INITIALISATION
 # ============================================
@@ -0,0 +1,325 @@
+"""Bus d'invalidation de cache inter-processus.
+
+Après chaque commit qui modifie un profil, l'application publie un événement
+versionné « profil modifié ». Chaque processus abonné reçoit les événements
+dans l'ordre des versions et appelle les hooks enregistrés par ses caches.
+
+Garanties :
+- ordre : les événements sont livrés dans l'ordre de publication ;
+- au moins une fois : la position de lecture n'avance qu'après l'exécution
+  de tous les hooks, un hook qui lève est rejoué au tour suivant (les hooks
+  doivent donc être idempotents, ce qui est naturel pour une invalidation) ;
+- resynchronisation : un abonné resté en retard de plus que la rétention du
+  journal ne peut plus recevoir les événements purgés ; il reçoit à la place
+  un événement ``kind='resync'`` (sans profil) et doit tout invalider.
+
+Backends :
+- ``sqlite:///chemin.db`` : table d'événements interrogée périodiquement,
+  aucun service externe requis (tous les workers d'un même nœud) ;
+- ``redis://...`` : flux Redis (XADD / XREAD), multi-nœuds, nécessite ``redis`` ;
+- ``local`` : distribution synchrone dans le processus (un seul worker).
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationBus:
+    """Base commune : abonnés, position de lecture et thread de réception"""
+
+    def __init__(self, poll_interval=0.2):
+        self.poll_interval = poll_interval
+        self._subscribers = []
+        self._position = None
+        self._last_version = None  # version du dernier événement livré (détection des trous)
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # un worker forké (gunicorn --preload) hérite d'un thread mort : on le relance dans l'enfant
+        os.register_at_fork(
+            before=_fork_hook(self, '_before_fork'),
+            after_in_parent=_fork_hook(self, '_after_fork_in_parent'),
+            after_in_child=_fork_hook(self, '_after_fork'),
+        )
+
+    # --- à implémenter par les backends ---
+    def _append(self, payload):
+        """Ajoute l'événement au journal ; retourne sa version (entier croissant)"""
+        raise NotImplementedError
+
+    def _head(self):
+        """(position, version) du dernier événement publié ; version None si inconnue"""
+        raise NotImplementedError
+
+    def _read(self, position, wait):
+        """Événements après `position` : liste de (position, event)"""
+        raise NotImplementedError
+
+    # --- API publique ---
+    def publish(self, profil_id, slug, kind):
+        """Publie un événement « profil modifié » ; retourne sa version"""
+        event = {
+            'profil_id': profil_id,
+            'slug': slug,
+            'kind': kind,
+            'published_at': time.time(),
+        }
+        return self._append(event)
+
+    def subscribe(self, callback):
+        """Enregistre un hook callback(event) ; utilisable comme décorateur"""
+        self._subscribers.append(callback)
+        self.start()
+        return callback
+
+    def start(self):
+        """Démarre l'écoute à partir du dernier événement déjà publié"""
+        with self._lock:
+            if self._thread:
+                return
+            self._position, self._last_version = self._head()
+            self._spawn()
+
+    def _spawn(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='invalidation-bus', daemon=True)
+        self._thread.start()
+
+    def _before_fork(self):
+        pass
+
+    def _after_fork_in_parent(self):
+        pass
+
+    def _after_fork(self):
+        # verrous recréés (ils ont pu être copiés pris) ; la position héritée est conservée,
+        # l'enfant reprend donc là où en était le cache qu'il a hérité du parent
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if self._thread:
+            self._spawn()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self, wait=False):
+        """Distribue les événements en attente ; retourne le nombre traité"""
+        count = 0
+        for position, event in self._read(self._position, wait):
+            if self._last_version is not None and event['version'] > self._last_version + 1:
+                # événements purgés par la rétention avant d'avoir été lus : tout invalider
+                missed = event['version'] - self._last_version - 1
+                logger.warning('Invalidation bus: %d événements perdus, resynchronisation', missed)
+                self._dispatch({
+                    'profil_id': None,
+                    'slug': None,
+                    'kind': 'resync',
+                    'published_at': time.time(),
+                    'version': event['version'] - 1,
+                    'missed': missed,
+                })
+            self._dispatch(event)
+            self._position = position
+            self._last_version = event['version']
+            count += 1
+        return count
+
+    def _dispatch(self, event):
+        for callback in list(self._subscribers):
+            callback(event)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll(wait=True)
+            except Exception:
+                logger.exception('Invalidation bus: hook ou lecture en échec, nouvel essai')
+                self._stop.wait(self.poll_interval)
+
+
+def _fork_hook(bus, name):
+    # référence faible : os.register_at_fork ne permet pas de désinscrire un hook
+    ref = weakref.ref(bus)
+    return lambda: ref() and getattr(ref(), name)()
+
+
+class LocalBus(InvalidationBus):
+    """Distribution synchrone dans le processus courant (déploiement mono-worker)"""
+
+    def __init__(self):
+        super().__init__()
+        self._version = 0
+        self._position = 0
+        self._events = []
+
+    def start(self):
+        pass  # pas de thread : publish() distribue directement
+
+    def publish(self, profil_id, slug, kind):
+        version = super().publish(profil_id, slug, kind)
+        self.poll()
+        return version
+
+    def _append(self, payload):
+        with self._lock:
+            self._version += 1
+            self._events = [item for item in self._events if item[0] > self._position]
+            self._events.append((self._version, {**payload, 'version': self._version}))
+            return self._version
+
+    def _head(self):
+        return self._version, self._version
+
+    def _read(self, position, wait):
+        with self._lock:
+            return [item for item in self._events if item[0] > position]
+
+
+class SQLiteBus(InvalidationBus):
+    """Journal d'événements dans un fichier SQLite partagé, lu par polling"""
+
+    def __init__(self, path, retention=10000, poll_interval=0.2):
+        super().__init__(poll_interval)
+        self.path = path
+        self.retention = retention  # nombre d'événements conservés pour les abonnés en retard
+        self._local = threading.local()
+        self._sql_lock = threading.Lock()  # pris par fork() : aucun thread ne doit être dans SQLite à ce moment
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # connexion temporaire : le bus est créé à l'import, avant un éventuel fork des workers
+        conn = self._open()
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'version INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'payload TEXT NOT NULL)'
+            )
+        finally:
+            conn.close()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _before_fork(self):
+        self._sql_lock.acquire()
+
+    def _after_fork_in_parent(self):
+        self._sql_lock.release()
+
+    def _after_fork(self):
+        self._sql_lock = threading.Lock()
+        super()._after_fork()
+
+    def _connect(self):
+        # une connexion par thread et par processus : sqlite3 ne les partage ni entre threads ni après fork()
+        pid, conn = getattr(self._local, 'conn', (None, None))
+        if pid != os.getpid():
+            conn = self._open()
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def _append(self, payload):
+        with self._sql_lock:
+            conn = self._connect()
+            # les écritures SQLite sont sérialisées : l'ordre des versions est l'ordre de commit
+            version = conn.execute('INSERT INTO events (payload) VALUES (?)', (json.dumps(payload),)).lastrowid
+            if version % 100 == 0:
+                conn.execute('DELETE FROM events WHERE version <= ?', (version - self.retention,))
+        return version
+
+    def _head(self):
+        with self._sql_lock:
+            version = self._connect().execute('SELECT COALESCE(MAX(version), 0) FROM events').fetchone()[0]
+        return version, version
+
+    def _read(self, position, wait):
+        with self._sql_lock:
+            rows = self._connect().execute(
+                'SELECT version, payload FROM events WHERE version > ? ORDER BY version LIMIT 500',
+                (position,)
+            ).fetchall()
+        if not rows and wait:
+            self._stop.wait(self.poll_interval)
+        return [(version, {**json.loads(payload), 'version': version}) for version, payload in rows]
+
+
+class RedisBus(InvalidationBus):
+    """Flux Redis partagé entre nœuds (XADD / XREAD bloquant)"""
+
+    def __init__(self, url, stream='econtact:invalidation', retention=10000, poll_interval=0.2):
+        super().__init__(poll_interval)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Backend Redis indisponible. Installez: pip install redis')
+        self.client = redis.Redis.from_url(url)
+        self.stream = stream
+        self.retention = retention
+        self._publish_script = self.client.register_script(
+            "local version = redis.call('INCR', KEYS[2]) "
+            "redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[2], '*', 'version', version, 'payload', ARGV[1]) "
+            "return version"
+        )
+
+    def _append(self, payload):
+        # INCR + XADD dans un même script : la version suit l'ordre du flux
+        return int(self._publish_script(
+            keys=[self.stream, f'{self.stream}:version'],
+            args=[json.dumps(payload), self.retention],
+        ))
+
+    def _head(self):
+        last = self.client.xrevrange(self.stream, count=1)
+        if not last:
+            return b'0-0', None
+        entry_id, fields = last[0]
+        return entry_id, int(fields[b'version'])
+
+    def _read(self, position, wait):
+        block = int(self.poll_interval * 1000) if wait else None
+        response = self.client.xread({self.stream: position}, count=500, block=block)
+        events = []
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                event = {**json.loads(fields[b'payload']), 'version': int(fields[b'version'])}
+                events.append((entry_id, event))
+        return events
+
+
+def create_bus(url):
+    """Construit le backend à partir d'une URL (sqlite:///..., redis://..., local)"""
+    if not url or url == 'local':
+        return LocalBus()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBus(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteBus(url[len('sqlite:///'):])
+    raise ValueError(f'Backend de bus inconnu: {url}')
+
+
+def bench_listener(url, expected, results):
+    """Processus abonné du bench : renvoie (version, délai) pour chaque événement reçu"""
+    bus = create_bus(url)
+    received = []
+    done = threading.Event()
+
+    def on_event(event):
+        received.append((event['version'], time.time() - event['published_at']))
+        if len(received) >= expected:
+            done.set()
+
+    bus.subscribe(on_event)
+    results.put('ready')
+    done.wait(60)
+    bus.stop()
+    results.put(received)
@@ -0,0 +1,226 @@
+"""Vérification concurrente de l'état des liens (Lien.url).
+
+Crawler asyncio basé sur aiohttp :
+- une seule session : pool de connexions réutilisées, plafond global et par hôte ;
+- HEAD d'abord, puis GET si le serveur refuse HEAD ou répond une erreur ;
+- redirections suivies manuellement pour conserver la chaîne complète ;
+- robots.txt lu une fois par origine et respecté ;
+- délai maximal par requête, les hôtes muets ne bloquent pas le reste ;
+- ce délai ne court qu'une fois une place obtenue auprès de l'hôte : l'attente
+  derrière les autres liens d'un même hôte n'est pas comptée comme un timeout.
+"""
+import asyncio
+import itertools
+import time
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+USER_AGENT = 'EContactPro-LinkChecker/1.0'
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+
+class RedirectError(Exception):
+    pass
+
+
+def new_result(url):
+    return {
+        'url': url,
+        'status_code': None,
+        'final_url': None,
+        'redirects': [],
+        'error': None,
+        'is_ok': None,
+        'elapsed_ms': 0,
+    }
+
+
+def host_of(url):
+    try:
+        return urlsplit(url).netloc
+    except ValueError:
+        return ''  # URL invalide : signalée par LinkChecker.check
+
+
+def interleave_by_host(urls):
+    """Alterne les hôtes pour qu'un hôte lent n'occupe pas tous les workers"""
+    by_host = {}
+    for url in urls:
+        by_host.setdefault(host_of(url), []).append(url)
+    missing = object()
+    return [url for group in itertools.zip_longest(*by_host.values(), fillvalue=missing)
+            for url in group if url is not missing]
+
+
+class LinkChecker:
+    def __init__(self, concurrency=100, per_host=4, timeout=10, max_redirects=10,
+                 respect_robots=True, user_agent=USER_AGENT):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.respect_robots = respect_robots
+        self.user_agent = user_agent
+        self._session = None
+        self._robots = {}  # origine -> RobotFileParser (None : tout est permis)
+        self._robots_locks = {}
+        self._host_slots = {}  # origine -> Semaphore(per_host)
+
+    async def check_all(self, urls):
+        """Vérifie chaque URL une seule fois ; retourne {url: résultat}"""
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {'User-Agent': self.user_agent}
+        results = {}
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            self._session = session
+            pending = iter(interleave_by_host(dict.fromkeys(urls)))
+
+            async def worker():
+                for url in pending:
+                    try:
+                        results[url] = await self.check(url)
+                    except Exception as e:
+                        # une URL ne doit jamais faire échouer tout le lot
+                        results[url] = {**new_result(url), 'error': type(e).__name__, 'is_ok': False}
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return results
+
+    async def check(self, url):
+        result = new_result(url)
+        try:
+            scheme = urlsplit(url).scheme
+        except ValueError:
+            result.update(error='invalid_url', is_ok=False)
+            return result
+        if scheme not in ('http', 'https'):
+            result['error'] = 'skipped'  # mailto:, tel:...
+            return result
+
+        start = time.perf_counter()
+        try:
+            if not await self.allowed_by_robots(url):
+                result['error'] = 'robots'
+            else:
+                status, final_url, chain = await self.resolve(url, 'HEAD')
+                if status >= 400:
+                    status, final_url, chain = await self.resolve(url, 'GET')
+                result.update(status_code=status, final_url=final_url, redirects=chain, is_ok=status < 400)
+        except asyncio.TimeoutError:
+            result.update(error='timeout', is_ok=False)
+        except RedirectError as e:
+            result.update(error=str(e), is_ok=False)
+        except aiohttp.ClientError as e:
+            result.update(error=type(e).__name__, is_ok=False)
+        except (ValueError, UnicodeError):
+            result.update(error='invalid_url', is_ok=False)  # ex. label IDNA trop long
+        result['elapsed_ms'] = int((time.perf_counter() - start) * 1000)
+        return result
+
+    def host_slot(self, url):
+        """Places par origine, prises avant la requête : ClientTimeout(total) compterait sinon l'attente du pool"""
+        parts = urlsplit(url)
+        origin = f'{parts.scheme}://{parts.netloc}'
+        if origin not in self._host_slots:
+            self._host_slots[origin] = asyncio.Semaphore(self.per_host)
+        return self._host_slots[origin]
+
+    async def resolve(self, url, method):
+        """Suit les redirections ; retourne (statut final, URL finale, chaîne)"""
+        chain = []
+        for _ in range(self.max_redirects + 1):
+            async with self.host_slot(url), self._session.request(method, url, allow_redirects=False) as response:
+                status = response.status
+                location = response.headers.get('Location')
+            if status not in REDIRECT_STATUSES or not location:
+                return status, url, chain
+            chain.append(url)
+            url = urljoin(url, location)
+            if url in chain:
+                raise RedirectError('redirect_loop')
+        raise RedirectError('too_many_redirects')
+
+    async def allowed_by_robots(self, url):
+        if not self.respect_robots:
+            return True
+        parts = urlsplit(url)
+        origin = f'{parts.scheme}://{parts.netloc}'
+        if origin not in self._robots:
+            async with self._robots_locks.setdefault(origin, asyncio.Lock()):
+                if origin not in self._robots:
+                    self._robots[origin] = await self.fetch_robots(origin)
+        parser = self._robots[origin]
+        return parser is None or parser.can_fetch(self.user_agent, url)
+
+    async def fetch_robots(self, origin):
+        try:
+            async with self.host_slot(origin), self._session.get(origin + '/robots.txt') as response:
+                if response.status >= 400:
+                    return None
+                text = await response.text(errors='replace')
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+        parser = RobotFileParser()
+        parser.parse(text.splitlines())
+        return parser
+
+
+def check_urls(urls, **options):
+    """Point d'entrée synchrone (CLI)"""
+    return asyncio.run(LinkChecker(**options).check_all(urls))
+
+
+# ============================================
+# SERVEUR DE TEST LOCAL
+# ============================================
+async def start_stub_servers(count=4, latency=0.02):
+    """Lance `count` serveurs HTTP locaux (un hôte par port) ; retourne (runner, URLs de base)
+
+    Routes : /ok, /nohead (HEAD refusé), /redirect/<n>, /loop, /missing (404),
+    /slow (dépasse les délais courts), /private/* (interdit par robots.txt).
+    """
+    from aiohttp import web
+
+    async def ok(request):
+        await asyncio.sleep(latency)
+        return web.Response(text='ok')
+
+    async def redirect(request):
+        await asyncio.sleep(latency)
+        remaining = int(request.match_info['n'])
+        raise web.HTTPFound('/ok' if remaining <= 1 else f'/redirect/{remaining - 1}')
+
+    async def loop(request):
+        raise web.HTTPFound('/loop')
+
+    async def missing(request):
+        await asyncio.sleep(latency)
+        raise web.HTTPNotFound()
+
+    async def slow(request):
+        await asyncio.sleep(30)
+        return web.Response(text='trop tard')
+
+    async def robots(request):
+        return web.Response(text='User-agent: *\nDisallow: /private\n')
+
+    stub = web.Application()
+    stub.router.add_get('/ok', ok)
+    stub.router.add_get('/nohead', ok, allow_head=False)
+    stub.router.add_get('/redirect/{n}', redirect)
+    stub.router.add_get('/loop', loop)
+    stub.router.add_get('/missing', missing)
+    stub.router.add_get('/slow', slow)
+    stub.router.add_get('/private/{tail:.*}', ok)
+    stub.router.add_get('/robots.txt', robots)
+
+    runner = web.AppRunner(stub)
+    await runner.setup()
+    for _ in range(count):
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+    base_urls = [f'http://127.0.0.1:{port}' for _, port in runner.addresses]
+    return runner, base_urls